@@ -8,20 +8,26 @@ quantization, harmonic forcing, velocity conditioning, and vertical alignment.
 """
 
 import argparse
+import os
+import struct
 import sys
-import random
 from pathlib import Path
-from typing import List, Dict, Tuple, Optional
-from dataclasses import dataclass
-from collections import defaultdict
+from typing import Iterator, List, Dict, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
 
 try:
     import mido
-    from mido import MidiFile, MidiTrack, Message, MetaMessage
+    from mido import MidiFile, MetaMessage
 except ImportError:
     print("Error: mido library not found. Install with: pip install mido python-rtmidi")
     sys.exit(1)
 
+try:
+    import numpy as np
+except ImportError:
+    print("Error: numpy library not found. Install with: pip install numpy")
+    sys.exit(1)
+
 
 # Musical constants
 SCALE_PATTERNS = {
@@ -37,16 +43,182 @@ SCALE_PATTERNS = {
 
 NOTE_NAMES = ['C', 'Db', 'D', 'Eb', 'E', 'F', 'Gb', 'G', 'Ab', 'A', 'Bb', 'B']
 
+ROOT_MAP = {name.lower(): i for i, name in enumerate(NOTE_NAMES)}
+
+# Longest first, so 'mixolydian' is matched before its suffix 'lydian'
+MODE_SUFFIXES = sorted(SCALE_PATTERNS.keys(), key=len, reverse=True)
+
+
+def build_shift_lut(root: int, mode: str) -> np.ndarray:
+    """Shift from each pitch class to the nearest tone of the given scale."""
+    scale_notes = [(root + degree) % 12 for degree in SCALE_PATTERNS[mode]]
+    shift_lut = np.zeros(12, dtype=np.int8)
+    
+    for pitch_class in range(12):
+        if pitch_class not in scale_notes:
+            nearest = min(scale_notes, key=lambda sc: (abs(pitch_class - sc), sc))
+            shift = nearest - pitch_class
+            if shift > 6:
+                shift -= 12
+            elif shift < -6:
+                shift += 12
+            shift_lut[pitch_class] = shift
+    
+    return shift_lut
+
+
+# (root, mode) -> per-pitch-class shift, for every key force_to_scale accepts
+SCALE_SHIFT_LUT = {
+    (root, mode): build_shift_lut(root, mode)
+    for root in range(12)
+    for mode in SCALE_PATTERNS
+}
+
+
+# Record layout for callers that need one row per note
+NOTE_DTYPE = np.dtype([
+    ('pitch', 'i2'),
+    ('velocity', 'i2'),
+    ('start_tick', 'i4'),
+    ('end_tick', 'i4'),
+    ('channel', 'i1'),
+    ('track_idx', 'i2'),
+])
+
+
+class NoteSnapshot:
+    """Read-only copy of one note, backed by a row of a NOTE_DTYPE array.
+    
+    Snapshots are detached from the Notes columns they were taken from, so
+    assignment raises instead of silently changing nothing; edit the Notes
+    arrays to modify notes.
+    """
+
+    __slots__ = ('_records', '_index')
+
+    def __init__(self, records: np.ndarray, index: int):
+        object.__setattr__(self, '_records', records)
+        object.__setattr__(self, '_index', index)
 
-@dataclass
-class NoteEvent:
-    """Represents a MIDI note with timing and velocity."""
-    pitch: int
-    velocity: int
-    start_tick: int
-    end_tick: int
-    channel: int
-    track_idx: int
+    def __getattr__(self, name: str) -> int:
+        if name in NOTE_DTYPE.fields:
+            return int(self._records[name][self._index])
+        raise AttributeError(name)
+
+    def __setattr__(self, name: str, value: int) -> None:
+        raise AttributeError(f"NoteSnapshot is read-only; cannot set '{name}'")
+
+    def __reduce__(self):
+        return NoteSnapshot, (self._records, self._index)
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)}' for name in NOTE_DTYPE.names)
+        return f'NoteSnapshot({fields})'
+
+
+class Notes:
+    """Note events stored as parallel int32 arrays, one entry per note."""
+
+    def __init__(self, pitch, vel, start, end, ch, tr):
+        self.pitch = np.asarray(pitch, dtype=np.int32)
+        self.vel = np.asarray(vel, dtype=np.int32)
+        self.start = np.asarray(start, dtype=np.int32)
+        self.end = np.asarray(end, dtype=np.int32)
+        self.ch = np.asarray(ch, dtype=np.int32)
+        self.tr = np.asarray(tr, dtype=np.int32)
+
+    @classmethod
+    def from_records(cls, records: np.ndarray) -> 'Notes':
+        """Build the container from a NOTE_DTYPE array."""
+        return cls(
+            records['pitch'], records['velocity'],
+            records['start_tick'], records['end_tick'],
+            records['channel'], records['track_idx']
+        )
+
+    def to_records(self, indices=slice(None)) -> np.ndarray:
+        """Return a copy of the selected notes as a NOTE_DTYPE array."""
+        pitch = self.pitch[indices]
+        records = np.empty(len(pitch), dtype=NOTE_DTYPE)
+        records['pitch'] = pitch
+        records['velocity'] = self.vel[indices]
+        records['start_tick'] = self.start[indices]
+        records['end_tick'] = self.end[indices]
+        records['channel'] = self.ch[indices]
+        records['track_idx'] = self.tr[indices]
+        return records
+
+    def __len__(self) -> int:
+        return len(self.pitch)
+
+    def __getitem__(self, index: int) -> NoteSnapshot:
+        """Return a read-only snapshot of a single note."""
+        records = self.to_records([index])
+        records.flags.writeable = False
+        return NoteSnapshot(records, 0)
+
+    def __iter__(self) -> Iterator[NoteSnapshot]:
+        """Yield a read-only snapshot of every note, sharing one record array."""
+        records = self.to_records()
+        records.flags.writeable = False
+        for index in range(len(records)):
+            yield NoteSnapshot(records, index)
+
+    def take(self, indices) -> 'Notes':
+        """Return a new container holding the selected notes, in order."""
+        return Notes(
+            self.pitch[indices], self.vel[indices],
+            self.start[indices], self.end[indices],
+            self.ch[indices], self.tr[indices]
+        )
+
+
+def write_varlen(data: bytearray, value: int) -> None:
+    """Append a MIDI variable-length quantity to data."""
+    if value < 0x80:
+        data.append(value)
+        return
+    
+    groups = [value & 0x7F]
+    value >>= 7
+    while value:
+        groups.append((value & 0x7F) | 0x80)
+        value >>= 7
+    data.extend(reversed(groups))
+
+
+def _emit_track_bytes(metas: List[MetaMessage], deltas: List[int], status: List[int],
+                      note: List[int], vel: List[int]) -> bytes:
+    """Serialize a track's meta messages followed by its note events as an MTrk chunk."""
+    data = bytearray()
+    
+    # end_of_track is written once at the end; the delta of any earlier
+    # one is carried over to the next event
+    carry = 0
+    for msg in metas:
+        if msg.type == 'end_of_track':
+            carry += msg.time
+            continue
+        write_varlen(data, carry + msg.time)
+        data.extend(msg.bytes())
+        carry = 0
+    
+    # Channel events use running status
+    running_status = None
+    append = data.append
+    for delta, status_byte, key, velocity in zip(deltas, status, note, vel):
+        write_varlen(data, carry + delta)
+        carry = 0
+        if status_byte != running_status:
+            append(status_byte)
+            running_status = status_byte
+        append(key)
+        append(velocity)
+    
+    write_varlen(data, carry)
+    data.extend(b'\xff\x2f\x00')  # end_of_track
+    
+    return b'MTrk' + struct.pack('>I', len(data)) + bytes(data)
 
 
 class MIDIProcessor:
@@ -56,119 +228,122 @@ class MIDIProcessor:
         self.midi = midi_file
         self.args = args
         self.ticks_per_beat = midi_file.ticks_per_beat
-        self.notes: List[NoteEvent] = []
-        
-    def parse_notes(self) -> List[NoteEvent]:
-        """Extract note events from MIDI file."""
-        notes = []
-        active_notes = {}  # (track, channel, pitch) -> start_tick
-        
+        self.notes: Optional[Notes] = None
+        self.track_metas: List[List[MetaMessage]] = []
+        self.rng = np.random.default_rng()
+        
+    def parse_notes(self) -> Notes:
+        """Extract note events from MIDI file, keeping each track's meta messages."""
+        pitch, vel, start, end, ch, tr = [], [], [], [], [], []
+        self.track_metas = []
+
         for track_idx, track in enumerate(self.midi.tracks):
             current_tick = 0
-            
+            active_notes = {}  # (channel, pitch) -> (start_tick, velocity)
+            metas = []
+            self.track_metas.append(metas)
+
             for msg in track:
                 current_tick += msg.time
-                
-                if msg.type == 'note_on' and msg.velocity > 0:
-                    key = (track_idx, msg.channel, msg.note)
-                    active_notes[key] = current_tick
-                    
-                elif msg.type == 'note_off' or (msg.type == 'note_on' and msg.velocity == 0):
-                    key = (track_idx, msg.channel, msg.note)
-                    if key in active_notes:
-                        start_tick = active_notes.pop(key)
-                        notes.append(NoteEvent(
-                            pitch=msg.note,
-                            velocity=msg.velocity if msg.type == 'note_on' else 64,
-                            start_tick=start_tick,
-                            end_tick=current_tick,
-                            channel=msg.channel,
-                            track_idx=track_idx
-                        ))
-        
-        return notes
+                msg_type = msg.type
+
+                if msg_type == 'note_on' and msg.velocity > 0:
+                    active_notes[(msg.channel, msg.note)] = (current_tick, msg.velocity)
+
+                elif msg_type == 'note_off' or msg_type == 'note_on':
+                    onset = active_notes.pop((msg.channel, msg.note), None)
+                    if onset is not None:
+                        # Keep the note-on velocity; the release velocity is
+                        # 0 for running-status note-offs and carries no dynamics.
+                        pitch.append(msg.note)
+                        vel.append(onset[1])
+                        start.append(onset[0])
+                        end.append(current_tick)
+                        ch.append(msg.channel)
+                        tr.append(track_idx)
+
+                elif msg.is_meta:
+                    metas.append(msg.copy())
+
+        return Notes(pitch, vel, start, end, ch, tr)
     
     def get_quantize_ticks(self, division: str) -> int:
         """Convert division string (e.g., '1/16') to tick resolution."""
         numerator, denominator = map(int, division.split('/'))
-        return int(self.ticks_per_beat * 4 * numerator / denominator)
+        grid_ticks = int(self.ticks_per_beat * 4 * numerator / denominator)
+        if grid_ticks <= 0:
+            raise ValueError(
+                f"Division {division} is finer than the file resolution "
+                f"({self.ticks_per_beat} ticks per beat)"
+            )
+        return grid_ticks
     
-    def quantize_tick(self, tick: int, grid_ticks: int) -> int:
-        """Quantize a tick value to nearest grid division."""
-        return round(tick / grid_ticks) * grid_ticks
+    def quantize_tick(self, ticks: np.ndarray, grid_ticks: int) -> np.ndarray:
+        """Quantize tick values to nearest grid division (ties to even, as round())."""
+        steps, remainder = np.divmod(ticks, grid_ticks)
+        twice = remainder * 2
+        steps += (twice > grid_ticks) | ((twice == grid_ticks) & (steps % 2 == 1))
+        return steps * grid_ticks
     
-    def straighten_chords(self, notes: List[NoteEvent], window_ticks: int = 20) -> List[NoteEvent]:
+    def straighten_chords(self, notes: Notes, window_ticks: int = 20) -> Notes:
         """Align vertically staggered chord notes to their average onset."""
-        if not notes:
+        if not len(notes):
             return notes
         
-        # Group notes by temporal proximity
-        sorted_notes = sorted(notes, key=lambda n: n.start_tick)
-        clusters = []
-        current_cluster = [sorted_notes[0]]
-        
-        for note in sorted_notes[1:]:
-            if note.start_tick - current_cluster[-1].start_tick <= window_ticks:
-                current_cluster.append(note)
-            else:
-                clusters.append(current_cluster)
-                current_cluster = [note]
-        clusters.append(current_cluster)
+        # Group notes by temporal proximity: a gap wider than the window
+        # between consecutive onsets starts a new cluster
+        notes = notes.take(np.argsort(notes.start, kind='stable'))
+        start, end = notes.start, notes.end
+        heads = np.concatenate(([0], np.flatnonzero(np.diff(start) > window_ticks) + 1))
+        sizes = np.diff(heads, append=len(start))
         
         # Align each cluster to mean onset
-        aligned_notes = []
-        for cluster in clusters:
-            if len(cluster) > 1:
-                mean_onset = sum(n.start_tick for n in cluster) // len(cluster)
-                for note in cluster:
-                    duration = note.end_tick - note.start_tick
-                    note.start_tick = mean_onset
-                    note.end_tick = mean_onset + duration
-            aligned_notes.extend(cluster)
-        
-        return aligned_notes
+        sums = np.add.reduceat(start.astype(np.int64), heads)
+        duration = end - start
+        start[:] = np.repeat(sums // sizes, sizes)
+        np.add(start, duration, out=end)
+        
+        return notes
     
-    def apply_swing(self, notes: List[NoteEvent], swing_amount: float) -> List[NoteEvent]:
+    def apply_swing(self, notes: Notes, swing_amount: float) -> Notes:
         """Apply swing timing offset to off-beat notes."""
         grid_ticks = self.get_quantize_ticks('1/16')
+        offset = int(grid_ticks * swing_amount)
         
-        for note in notes:
-            beat_position = note.start_tick % (grid_ticks * 2)
-            if beat_position >= grid_ticks * 0.9:  # Off-beat detection
-                offset = int(grid_ticks * swing_amount)
-                duration = note.end_tick - note.start_tick
-                note.start_tick += offset
-                note.end_tick = note.start_tick + duration
+        beat_position = notes.start % (grid_ticks * 2)
+        off_beat = beat_position >= grid_ticks * 0.9  # Off-beat detection
+        notes.start[off_beat] += offset
+        notes.end[off_beat] += offset
         
         return notes
     
-    def humanize_timing(self, notes: List[NoteEvent], amount: int = 10) -> List[NoteEvent]:
+    def humanize_timing(self, notes: Notes, amount: int = 10) -> Notes:
         """Add micro-timing variance to note onsets."""
-        for note in notes:
-            offset = random.randint(-amount, amount)
-            duration = note.end_tick - note.start_tick
-            note.start_tick = max(0, note.start_tick + offset)
-            note.end_tick = note.start_tick + duration
+        start, end = notes.start, notes.end
+        offset = self.rng.integers(-amount, amount + 1, size=len(notes), dtype=np.int32)
+        duration = end - start
+        np.maximum(start + offset, 0, out=start)
+        np.add(start, duration, out=end)
         
         return notes
     
-    def scale_velocity(self, notes: List[NoteEvent], scale: float) -> List[NoteEvent]:
-        """Scale all velocities by a factor."""
-        for note in notes:
-            note.velocity = max(1, min(127, int(note.velocity * scale)))
-        return notes
-    
-    def clamp_velocity(self, notes: List[NoteEvent], min_vel: int, max_vel: int) -> List[NoteEvent]:
-        """Clamp velocities to specified range."""
-        for note in notes:
-            note.velocity = max(min_vel, min(max_vel, note.velocity))
-        return notes
-    
-    def humanize_velocity(self, notes: List[NoteEvent], variance: int = 15) -> List[NoteEvent]:
-        """Add random variance to velocity values."""
-        for note in notes:
-            offset = random.randint(-variance, variance)
-            note.velocity = max(1, min(127, note.velocity + offset))
+    def apply_velocity(self, notes: Notes, scale: Optional[float] = None,
+                       clamp: Optional[Tuple[int, int]] = None, variance: int = 0) -> Notes:
+        """Scale, clamp and humanize velocities in one pass over the array."""
+        # Saturate in floating point so large factors can't overflow the cast
+        if scale:
+            vel = np.clip(notes.vel * scale, 1, 127).astype(np.int32)
+        else:
+            vel = notes.vel
+        
+        if clamp:
+            np.clip(vel, clamp[0], clamp[1], out=vel)
+        
+        if variance:
+            vel += self.rng.integers(-variance, variance + 1, size=len(notes), dtype=np.int32)
+            np.clip(vel, 1, 127, out=vel)
+        
+        notes.vel = vel
         return notes
     
     def parse_key(self, key_str: str) -> Tuple[int, str]:
@@ -177,79 +352,51 @@ class MIDIProcessor:
         
         # Extract mode
         mode = 'major'
-        for scale_mode in SCALE_PATTERNS.keys():
+        for scale_mode in MODE_SUFFIXES:
             if key_str.endswith(scale_mode):
                 mode = scale_mode
                 key_str = key_str[:-len(scale_mode)]
                 break
         
         # Parse root note
-        root_map = {name.lower(): i for i, name in enumerate(NOTE_NAMES)}
-        root = root_map.get(key_str, 0)
+        root = ROOT_MAP.get(key_str, 0)
         
         return root, mode
     
-    def force_to_scale(self, notes: List[NoteEvent], root: int, mode: str) -> List[NoteEvent]:
+    def force_to_scale(self, notes: Notes, root: int, mode: str) -> Notes:
         """Constrain all notes to specified scale."""
-        scale_degrees = SCALE_PATTERNS[mode]
-        scale_notes = [(root + degree) % 12 for degree in scale_degrees]
-        
-        for note in notes:
-            pitch_class = note.pitch % 12
-            if pitch_class not in scale_notes:
-                # Find nearest scale tone
-                distances = [(abs(pitch_class - sc), sc) for sc in scale_notes]
-                distances.sort()
-                nearest = distances[0][1]
-                
-                # Calculate shift
-                shift = nearest - pitch_class
-                if shift > 6:
-                    shift -= 12
-                elif shift < -6:
-                    shift += 12
-                
-                note.pitch = max(0, min(127, note.pitch + shift))
-        
+        shift_lut = SCALE_SHIFT_LUT[(root, mode)]
+        pitch = notes.pitch
+        np.clip(pitch + shift_lut[pitch % 12], 0, 127, out=pitch)
         return notes
     
-    def deduplicate(self, notes: List[NoteEvent]) -> List[NoteEvent]:
+    def deduplicate(self, notes: Notes) -> Notes:
         """Remove duplicate notes at same time/pitch."""
-        seen = set()
-        unique_notes = []
-        
-        for note in notes:
-            key = (note.pitch, note.start_tick, note.channel)
-            if key not in seen:
-                seen.add(key)
-                unique_notes.append(note)
+        # Pack (start, pitch, channel) into one int64; pitch and channel
+        # each fit in a byte
+        key = (notes.start.astype(np.int64) << 16) | (notes.pitch.astype(np.int64) << 8) | notes.ch
+        _, first = np.unique(key, return_index=True)
+        first.sort()
         
-        return unique_notes
+        return notes.take(first)
     
-    def fix_legato(self, notes: List[NoteEvent]) -> List[NoteEvent]:
+    def fix_legato(self, notes: Notes) -> Notes:
         """Repair overlapping notes of same pitch."""
-        # Group by channel and pitch
-        pitch_groups = defaultdict(list)
-        for note in notes:
-            pitch_groups[(note.channel, note.pitch)].append(note)
-        
-        fixed_notes = []
-        for group in pitch_groups.values():
-            sorted_group = sorted(group, key=lambda n: n.start_tick)
-            
-            for i in range(len(sorted_group) - 1):
-                current = sorted_group[i]
-                next_note = sorted_group[i + 1]
-                
-                # If overlap detected, trim current note
-                if current.end_tick > next_note.start_tick:
-                    current.end_tick = next_note.start_tick
-            
-            fixed_notes.extend(sorted_group)
+        # Order by channel, pitch, then onset so each note is followed by
+        # the next note of its (channel, pitch) group
+        order = np.lexsort((notes.start, notes.pitch, notes.ch))
+        ch, pitch = notes.ch[order], notes.pitch[order]
+        start, end = notes.start[order], notes.end[order]
+        
+        # If overlap detected, trim current note to the next onset
+        same_group = (ch[:-1] == ch[1:]) & (pitch[:-1] == pitch[1:])
+        overlap = same_group & (end[:-1] > start[1:])
+        end[:-1][overlap] = start[1:][overlap]
+        notes.end[order] = end
         
-        return fixed_notes
+        return notes
     
-    def process(self) -> List[NoteEvent]:
+    def process(self) -> Notes:
         """Apply all enabled processing steps."""
         print(f"Parsing MIDI file...")
         notes = self.parse_notes()
@@ -263,10 +410,9 @@ class MIDIProcessor:
         if self.args.quantize:
             print(f"  Quantizing to {self.args.quantize}...")
             grid_ticks = self.get_quantize_ticks(self.args.quantize)
-            for note in notes:
-                duration = note.end_tick - note.start_tick
-                note.start_tick = self.quantize_tick(note.start_tick, grid_ticks)
-                note.end_tick = note.start_tick + duration
+            duration = notes.end - notes.start
+            notes.start[:] = self.quantize_tick(notes.start, grid_ticks)
+            np.add(notes.start, duration, out=notes.end)
         
         if self.args.swing:
             print(f"  Applying swing ({self.args.swing})...")
@@ -279,16 +425,21 @@ class MIDIProcessor:
         # Velocity operations
         if self.args.vel_scale:
             print(f"  Scaling velocity by {self.args.vel_scale}...")
-            notes = self.scale_velocity(notes, self.args.vel_scale)
         
         if self.args.vel_clamp:
             min_v, max_v = self.args.vel_clamp
             print(f"  Clamping velocity to {min_v}-{max_v}...")
-            notes = self.clamp_velocity(notes, min_v, max_v)
         
         if self.args.vel_human:
             print("  Humanizing velocity...")
-            notes = self.humanize_velocity(notes)
+        
+        if self.args.vel_scale or self.args.vel_clamp or self.args.vel_human:
+            notes = self.apply_velocity(
+                notes,
+                scale=self.args.vel_scale,
+                clamp=self.args.vel_clamp,
+                variance=15 if self.args.vel_human else 0
+            )
         
         # Reconstruction operations
         if self.args.force_key:
@@ -306,61 +457,52 @@ class MIDIProcessor:
             print("  Fixing legato overlaps...")
             notes = self.fix_legato(notes)
         
+        self.notes = notes
         return notes
     
-    def reconstruct_midi(self, notes: List[NoteEvent]) -> MidiFile:
-        """Rebuild MIDI file from processed notes."""
-        new_midi = MidiFile(ticks_per_beat=self.ticks_per_beat)
-        
-        # Group notes by track
-        track_notes = defaultdict(list)
-        for note in notes:
-            track_notes[note.track_idx].append(note)
-        
-        # Recreate tracks
-        for track_idx in range(len(self.midi.tracks)):
-            new_track = MidiTrack()
-            new_midi.tracks.append(new_track)
-            
-            # Copy meta messages from original track
-            for msg in self.midi.tracks[track_idx]:
-                if msg.is_meta:
-                    new_track.append(msg.copy())
-            
-            # Add processed notes
-            if track_idx in track_notes:
-                events = []
-                
-                for note in track_notes[track_idx]:
-                    events.append((note.start_tick, 'note_on', note))
-                    events.append((note.end_tick, 'note_off', note))
-                
-                events.sort(key=lambda x: (x[0], x[1] == 'note_off'))  # note_on before note_off
-                
-                current_tick = 0
-                for tick, event_type, note in events:
-                    delta = tick - current_tick
-                    
-                    if event_type == 'note_on':
-                        new_track.append(Message(
-                            'note_on',
-                            note=note.pitch,
-                            velocity=note.velocity,
-                            time=delta,
-                            channel=note.channel
-                        ))
-                    else:
-                        new_track.append(Message(
-                            'note_off',
-                            note=note.pitch,
-                            velocity=0,
-                            time=delta,
-                            channel=note.channel
-                        ))
-                    
-                    current_tick = tick
-        
-        return new_midi
+    def _build_track(self, notes: Notes, track_idx: int, idx: np.ndarray) -> bytes:
+        """Serialize one track from its meta messages and the notes at idx."""
+        n = len(idx)
+        
+        # Data bytes are written unchecked, so reject anything a MIDI file can't hold
+        for name, values in (('pitch', notes.pitch[idx]), ('velocity', notes.vel[idx])):
+            if n and (values.min() < 0 or values.max() > 127):
+                raise ValueError(f"Track {track_idx}: {name} out of range 0..127")
+        
+        # Note-ons occupy rows [0, n), note-offs rows [n, 2n)
+        ticks = np.concatenate((notes.start[idx], notes.end[idx])).astype(np.int64)
+        is_off = np.repeat(np.array([0, 1], dtype=np.int64), n)
+        pitches = np.concatenate((notes.pitch[idx], notes.pitch[idx]))
+        vels = np.concatenate((notes.vel[idx], np.zeros(n, dtype=np.int32)))
+        status = np.concatenate((0x90 | notes.ch[idx], 0x80 | notes.ch[idx]))
+        
+        # Sort by tick, note_on before note_off
+        order = np.argsort((ticks << 1) | is_off, kind='stable')
+        deltas = np.diff(ticks[order], prepend=0)
+        
+        return _emit_track_bytes(
+            self.track_metas[track_idx], deltas.tolist(), status[order].tolist(),
+            pitches[order].tolist(), vels[order].tolist()
+        )
+    
+    def reconstruct_midi(self, notes: Notes) -> bytes:
+        """Rebuild MIDI file from processed notes as Standard MIDI File bytes."""
+        num_tracks = len(self.track_metas)
+        header = b'MThd' + struct.pack('>Ihhh', 6, 1, num_tracks, self.ticks_per_beat)
+        
+        # Group notes by track: one index array per track, empty if it has no notes
+        order = np.argsort(notes.tr, kind='stable')
+        boundaries = np.searchsorted(notes.tr[order], np.arange(1, num_tracks))
+        track_notes = np.split(order, boundaries)
+        
+        # Tracks are independent; map() keeps them in file order
+        def build(track_idx: int) -> bytes:
+            return self._build_track(notes, track_idx, track_notes[track_idx])
+        
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            tracks = list(executor.map(build, range(num_tracks)))
+        
+        return header + b''.join(tracks)
 
 
 def main():
@@ -415,6 +557,12 @@ Examples:
         print(f"Error: Input file not found: {args.input}")
         sys.exit(1)
     
+    if args.vel_clamp:
+        min_v, max_v = args.vel_clamp
+        if not 0 <= min_v <= max_v <= 127:
+            print(f"Error: Invalid velocity range: {min_v}-{max_v} (expected 0 <= MIN <= MAX <= 127)")
+            sys.exit(1)
+    
     # Check output
     output_path = Path(args.output)
     if output_path.exists() and not args.overwrite and not args.dry_run:
@@ -435,10 +583,10 @@ Examples:
             print(f"Would output {len(processed_notes)} notes to: {args.output}")
         else:
             print(f"\nReconstructing MIDI file...")
-            new_midi = processor.reconstruct_midi(processed_notes)
+            midi_bytes = processor.reconstruct_midi(processed_notes)
             
             output_path.parent.mkdir(parents=True, exist_ok=True)
-            new_midi.save(args.output)
+            output_path.write_bytes(midi_bytes)
             print(f"✓ Saved: {args.output}")
         
     except Exception as e: